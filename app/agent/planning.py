@@ -210,8 +210,8 @@ class PlanningAgent(ToolCallAgent):
         self.memory.add_messages(messages)
         response = await self.llm.ask_tool(
             messages=messages,
-            system_msgs=[Message.system_message(self.system_prompt)],
-            tools=self.available_tools.to_params(),
+            system_msgs=[self._get_system_message()],
+            tools=self._get_tool_params(),
             tool_choice=ToolChoice.AUTO,
         )
         assistant_msg = Message.from_tool_calls(
@@ -223,7 +223,7 @@ class PlanningAgent(ToolCallAgent):
         plan_created = False
         for tool_call in response.tool_calls:
             if tool_call.function.name == "planning":
-                result = await self.execute_tool(tool_call)
+                result, _ = await self.execute_tool(tool_call)
                 logger.info(
                     f"Executed tool {tool_call.function.name} with result: {result}"
                 )
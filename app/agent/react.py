@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
-import json
 import re
+from functools import lru_cache
 from typing import Optional, Union, Dict, Any, List
 
+import ahocorasick
+import orjson
 from pydantic import Field
 
 from app.agent.base import BaseAgent
@@ -11,6 +13,95 @@ from app.logger import logger
 from app.schema import AgentState, Memory, Message, ToolCall, Function
 
 
+# Common question patterns. Closing statements such as "if you need any further
+# assistance, please let me know" are not questions, so the closing pattern only
+# counts when no negative marker is present, while the leading patterns always win.
+_LEADING_QUESTION_PATTERNS = [
+    "would you like",
+    "do you want",
+    "can you",
+    "could you",
+    "please provide",
+]
+_CLOSING_PATTERN = "please let me know"
+_TRAILING_QUESTION_PATTERNS = [
+    "please specify",
+    "tell me",
+    # Don't treat "if you need any further assistance, let me know" as a question
+    # "let me know",
+    "if you have",
+    "if you would like",
+]
+# Patterns that need a regex, all with the same (trailing) precedence
+_WILDCARD_QUESTION_PATTERNS = [
+    r"what.*(?:would|should|can|could)",
+    r"how.*(?:would|should|can|could)",
+    r"which.*(?:option|choice)",
+]
+_NEGATIVE_MARKERS = ("if you need", "further assistance")
+
+_LEADING, _CLOSING, _TRAILING = "leading", "closing", "trailing"
+
+
+def _build_question_automaton() -> ahocorasick.Automaton:
+    """Build an automaton finding all plain question patterns in one pass"""
+    automaton = ahocorasick.Automaton()
+    for pattern in _LEADING_QUESTION_PATTERNS:
+        automaton.add_word(pattern, _LEADING)
+    automaton.add_word(_CLOSING_PATTERN, _CLOSING)
+    for pattern in _TRAILING_QUESTION_PATTERNS:
+        automaton.add_word(pattern, _TRAILING)
+    automaton.make_automaton()
+    return automaton
+
+
+# Text is lowercased once up front, so the patterns are matched case-sensitively
+_QUESTION_AUTOMATON = _build_question_automaton()
+_WILDCARD_QUESTION_RE = re.compile("|".join(_WILDCARD_QUESTION_PATTERNS))
+
+# Length of the shortest text any question pattern can match ("howcan")
+_MIN_QUESTION_LENGTH = 6
+
+
+def _is_question(text: str) -> bool:
+    """Detect whether text asks a question, see `ReActAgent._is_asking_question`."""
+    # Skip status/information messages that just happen to contain question patterns
+    if text.startswith("I successfully"):
+        return False
+    text_lower = text.casefold()
+    if "sum of" in text_lower or "sum is" in text_lower:
+        return False
+
+    # Check for question marks
+    if "?" in text:
+        return True
+
+    # Too short to contain any of the question patterns
+    if len(text_lower) < _MIN_QUESTION_LENGTH:
+        return False
+
+    # Plain question patterns, scanned in a single pass
+    closing = matched = False
+    for _, kind in _QUESTION_AUTOMATON.iter(text_lower):
+        if kind == _LEADING:
+            return True
+        if kind == _CLOSING:
+            closing = True
+        else:
+            matched = True
+
+    # Don't treat closing statements as questions
+    if closing:
+        return not any(marker in text_lower for marker in _NEGATIVE_MARKERS)
+
+    return matched or bool(_WILDCARD_QUESTION_RE.search(text_lower))
+
+
+# Only short texts are memoized, which keeps the cache memory bounded
+_MAX_CACHED_QUESTION_LENGTH = 256
+_cached_is_question = lru_cache(maxsize=1024)(_is_question)
+
+
 class ReActAgent(BaseAgent, ABC):
     name: str
     description: Optional[str] = None
@@ -61,16 +152,20 @@ class ReActAgent(BaseAgent, ABC):
                                 "requires_user_response": True
                             }
             except Exception as e:
-                logger.error(f"Error checking for questions in assistant response: {str(e)}")
+                logger.error("Error checking for questions in assistant response: {}", e)
                 # Continue with normal execution
             
             return "Thinking complete - no action needed"
         
         return await self.act()
         
-    def _is_asking_question(self, text: str) -> bool:
+    @staticmethod
+    def _is_asking_question(text: str) -> bool:
         """
         Detects if the given text is asking a question or requesting input from the user.
+
+        Results for short texts are memoized, since the same snippets tend to
+        come back across steps and runs.
         
         Args:
             text: The text to analyze
@@ -78,105 +173,55 @@ class ReActAgent(BaseAgent, ABC):
         Returns:
             bool: True if the text appears to be asking for user input
         """
-        # Skip status/information messages that just happen to contain question patterns
-        if text.startswith("I successfully") or "sum of" in text.lower() or "sum is" in text.lower():
-            return False
-            
-        # Check for question marks
-        if "?" in text:
-            return True
-            
-        # Common question patterns
-        question_patterns = [
-            r"(?i)would you like",
-            r"(?i)do you want",
-            r"(?i)can you",
-            r"(?i)could you",
-            r"(?i)please provide",
-            r"(?i)please let me know",
-            r"(?i)please specify",
-            r"(?i)tell me",
-            r"(?i)what.*(?:would|should|can|could)",
-            r"(?i)how.*(?:would|should|can|could)",
-            r"(?i)which.*(?:option|choice)",
-            # Don't treat "if you need any further assistance, let me know" as a question
-            # r"(?i)let me know",
-            r"(?i)if you have",
-            r"(?i)if you would like",
-        ]
+        if len(text) <= _MAX_CACHED_QUESTION_LENGTH:
+            return _cached_is_question(text)
+        return _is_question(text)
         
-        for pattern in question_patterns:
-            if re.search(pattern, text):
-                # Don't treat closing statements as questions
-                if pattern == r"(?i)please let me know" and ("if you need" in text.lower() or "further assistance" in text.lower()):
-                    return False
-                return True
-                
-        return False
-        
-    def _create_ask_user_tool_call(self, question_text: str) -> List[ToolCall]:
+    def _create_ask_user_tool_call(
+        self, question_text: str, max_length: int = 300
+    ) -> List[ToolCall]:
         """
         Safely create an ask_user tool call from a question text.
         
         Args:
             question_text: The text of the question
+            max_length: Maximum length of the question before it is truncated
             
         Returns:
             List[ToolCall]: A list containing the ask_user tool call
         """
         try:
             # Trim question text if too long to prevent JSON serialization issues
-            max_length = 300  # More conservative size
             if len(question_text) > max_length:
                 question_text = question_text[:max_length] + "..."
                 
-            # Sanitize question text for JSON 
-            # Replace newlines with spaces and escape quotes for JSON safety
-            question_text = question_text.replace('\n', ' ').replace('\r', ' ')
-            
-            # Create the arguments as a proper Python dictionary first
-            args = {
-                "question": question_text,
-                "dangerous_action": False,
-                "question_type": "follow-up"
-            }
-            
-            # Convert to JSON with error handling
-            try:
-                args_json = json.dumps(args)
-            except Exception as json_err:
-                logger.error(f"JSON serialization error: {str(json_err)}, using simplified question")
-                # Try with simpler text if JSON fails
-                args = {
-                    "question": "I need more information to proceed. Please provide details.",
+            # Replace newlines with spaces for cleaner display, and replace lone
+            # surrogates so the question is always valid UTF-8 for orjson
+            question_text = (
+                question_text.replace('\n', ' ')
+                .replace('\r', ' ')
+                .encode("utf-8", "replace")
+                .decode("utf-8")
+            )
+            args_json = orjson.dumps(
+                {
+                    "question": question_text,
                     "dangerous_action": False,
                     "question_type": "follow-up"
                 }
-                args_json = json.dumps(args)
-                
-            # Create the function object using the schema's Function class
-            try:
-                function_obj = Function(
-                    name="ask_user",
-                    arguments=args_json
-                )
-            except Exception as func_err:
-                logger.error(f"Error creating Function object: {str(func_err)}, {type(func_err)}")
-                return []
-                
-            # Create the full tool call
-            try:
-                ask_user_tool = ToolCall(
+            ).decode()
+
+            # All fields are generated here, so the models need no validation
+            return [
+                ToolCall.model_construct(
                     id="auto_ask_user",
                     type="function",
-                    function=function_obj
+                    function=Function.model_construct(
+                        name="ask_user", arguments=args_json
+                    ),
                 )
-                return [ask_user_tool]
-            except Exception as tool_err:
-                logger.error(f"Error creating ToolCall object: {str(tool_err)}, {type(tool_err)}")
-                return []
-                
+            ]
         except Exception as e:
-            logger.error(f"Error creating ask_user tool call: {str(e)}, {type(e)}")
-            logger.error(f"Question text causing error: '{question_text[:100]}...'")
+            logger.error("Error creating ask_user tool call: {}, {}", e, type(e))
+            logger.error("Question text causing error: '{}...'", question_text[:100])
             return []
@@ -1,19 +1,72 @@
+import asyncio
 import json
-import re
-from typing import Any, Dict, List, Optional, Union
-
-from pydantic import Field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import orjson
+from pydantic import Field, PrivateAttr
 
 from app.agent.react import ReActAgent
 from app.exceptions import TokenLimitExceeded
+from app.llm_cache import cached_ask_tool
 from app.logger import logger
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
-from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice, Function
+from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
 from app.tool.ask_user import AskUser
 
 
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
+TOOL_ERROR = "⚠️ Tool '{}' encountered a problem: {}"
+
+
+# A tool's result together with whether it requires a response from the user
+ToolOutcome = Tuple[Union[str, Dict[str, Any]], bool]
+
+
+def _needs_user_input(result: Any) -> bool:
+    """Check whether a tool result asks for a response from the user"""
+    return isinstance(result, dict) and bool(result.get("requires_user_response"))
+
+
+def _parse_arguments(arguments: str) -> Any:
+    """Parse tool call arguments, accepting everything `json.loads` does"""
+    try:
+        return orjson.loads(arguments)
+    except orjson.JSONDecodeError:
+        # orjson rejects NaN, Infinity and out-of-range numbers
+        return json.loads(arguments)
+
+
+def _dump_result(result: Any) -> str:
+    """Serialize a tool result as JSON, falling back to its string form"""
+    try:
+        return orjson.dumps(
+            result, default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+    except TypeError:
+        # e.g. integers wider than 64 bits, which orjson refuses to encode
+        return str(result)
+
+
+def _truncate(text: str, limit: Optional[Union[int, bool]]) -> str:
+    """Cut text down to at most `limit` UTF-8 bytes, if a limit is set"""
+    if not limit:
+        return text
+    # No character takes less than a byte, so only the first `limit` characters
+    # can fall within the first `limit` bytes
+    encoded = text[:limit].encode("utf-8", "replace")
+    return encoded[:limit].decode("utf-8", "ignore")
 
 
 class ToolCallAgent(ReActAgent):
@@ -36,31 +89,73 @@ class ToolCallAgent(ReActAgent):
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
 
+    # Serve repeated LLM requests from the process-wide response cache. Streamed
+    # responses are never cached, so this has no effect with `stream_tool_calls`
+    use_llm_cache: bool = False
+    # Optional text embedding function enabling the semantic LLM response cache
+    embed_fn: Optional[Callable[[str], Sequence[float]]] = None
+
+    # Stream the LLM response and start regular tools before it is complete.
+    # Takes precedence over `use_llm_cache`
+    stream_tool_calls: bool = False
+
+    # Per-step request parts, rebuilt only when their source changes
+    _tool_params_cache: Optional[Tuple[tuple, List[dict]]] = PrivateAttr(default=None)
+    _system_msg_cache: Optional[Message] = PrivateAttr(default=None)
+    _next_step_msg_cache: Optional[Message] = PrivateAttr(default=None)
+    _special_tool_names_cache: Optional[Tuple[tuple, FrozenSet[str]]] = PrivateAttr(
+        default=None
+    )
+    # Tool calls started while streaming, keyed by `id()` of the call, since
+    # providers may omit call ids or repeat them
+    _pending_tool_tasks: Dict[int, Tuple[ToolCall, asyncio.Task]] = PrivateAttr(
+        default_factory=dict
+    )
+
+    async def run(self, request: Optional[str] = None) -> str:
+        """Run the agent, cancelling any tool calls still pending when it ends"""
+        try:
+            return await super().run(request)
+        finally:
+            self._cancel_pending_tool_tasks()
+
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
         if self.next_step_prompt:
-            user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            # Append a copy, so later changes to the message can't poison the cache
+            self.messages.append(self._get_next_step_message().model_copy())
 
+        system_msgs = [self._get_system_message()] if self.system_prompt else None
         try:
             # Get response with tool options
-            response = await self.llm.ask_tool(
-                messages=self.messages,
-                system_msgs=[Message.system_message(self.system_prompt)]
-                if self.system_prompt
-                else None,
-                tools=self.available_tools.to_params(),
-                tool_choice=self.tool_choices,
-            )
+            if self.stream_tool_calls:
+                response = await self._stream_tool_calls(system_msgs)
+            elif self.use_llm_cache:
+                response = await cached_ask_tool(
+                    self.llm,
+                    messages=self.messages,
+                    system_msgs=system_msgs,
+                    tools=self._get_tool_params(),
+                    tool_choice=self.tool_choices,
+                    embed_fn=self.embed_fn,
+                    ignored_prompt=self.next_step_prompt,
+                )
+            else:
+                response = await self.llm.ask_tool(
+                    messages=self.messages,
+                    system_msgs=system_msgs,
+                    tools=self._get_tool_params(),
+                    tool_choice=self.tool_choices,
+                )
         except ValueError:
             raise
         except Exception as e:
-            # Check if this is a RetryError containing TokenLimitExceeded
-            if hasattr(e, "__cause__") and isinstance(e.__cause__, TokenLimitExceeded):
-                token_limit_error = e.__cause__
-                logger.error(
-                    f"🚨 Token limit error (from RetryError): {token_limit_error}"
-                )
+            # Check if this is TokenLimitExceeded, possibly wrapped in a RetryError
+            if isinstance(e, TokenLimitExceeded) or (
+                hasattr(e, "__cause__") and isinstance(e.__cause__, TokenLimitExceeded)
+            ):
+                token_limit_error = e if isinstance(e, TokenLimitExceeded) else e.__cause__
+                logger.error("🚨 Token limit error: {}", token_limit_error)
                 self.memory.add_message(
                     Message.assistant_message(
                         f"Maximum token limit reached, cannot continue execution: {str(token_limit_error)}"
@@ -102,28 +197,26 @@ class ToolCallAgent(ReActAgent):
                         logger.info(f"🔄 Converting question to ask_user tool call: {response.content}")
                         
                         # Use the safe method to create the tool call
-                        self.tool_calls = self._create_ask_user_tool_call(response.content)
+                        self.tool_calls = self._create_ask_user_tool_call(
+                            response.content, max_length=500
+                        )
                         
                         # Only proceed if we successfully created the tool call
                         if self.tool_calls:
                             # Create and add the assistant message
-                            assistant_msg = Message.from_tool_calls(
-                                content=f"I need to get more information from you", 
+                            assistant_msg = Message.from_llm_response(
+                                content="I need to get more information from you",
                                 tool_calls=self.tool_calls
                             )
                             self.memory.add_message(assistant_msg)
                             return True
                 except Exception as e:
-                    logger.error(f"Error converting question to ask_user tool call: {str(e)}")
+                    logger.error("Error converting question to ask_user tool call: {}", e)
                     # Fall through to normal processing
 
             # Create and add assistant message
-            assistant_msg = (
-                Message.from_tool_calls(
-                    content=response.content, tool_calls=self.tool_calls
-                )
-                if self.tool_calls
-                else Message.assistant_message(response.content)
+            assistant_msg = Message.from_llm_response(
+                content=response.content, tool_calls=self.tool_calls
             )
             self.memory.add_message(assistant_msg)
 
@@ -136,7 +229,7 @@ class ToolCallAgent(ReActAgent):
 
             return bool(self.tool_calls)
         except Exception as e:
-            logger.error(f"🚨 Oops! The {self.name}'s thinking process hit a snag: {e}")
+            logger.error("🚨 Oops! The {}'s thinking process hit a snag: {}", self.name, e)
             self.memory.add_message(
                 Message.assistant_message(
                     f"Error encountered while processing: {str(e)}"
@@ -144,6 +237,22 @@ class ToolCallAgent(ReActAgent):
             )
             return False
 
+    def _get_tool_params(self) -> List[dict]:
+        """Return the tool params, rebuilt only when the tool collection changes"""
+        tools = self.available_tools.tools
+        if self._tool_params_cache is None or self._tool_params_cache[0] is not tools:
+            self._tool_params_cache = (tools, self.available_tools.to_params())
+        return self._tool_params_cache[1]
+
+    def _get_system_message(self) -> Message:
+        """Return the system message, rebuilt only when the system prompt changes"""
+        if (
+            self._system_msg_cache is None
+            or self._system_msg_cache.content != self.system_prompt
+        ):
+            self._system_msg_cache = Message.system_message(self.system_prompt)
+        return self._system_msg_cache
+
     async def act(self) -> Union[str, Dict[str, Any]]:
         """Execute tool calls and handle their results"""
         if not self.tool_calls:
@@ -153,49 +262,179 @@ class ToolCallAgent(ReActAgent):
             # Return last message content if no tool calls
             return self.messages[-1].content or "No content or commands to execute"
 
+        try:
+            return await self._act_on_tool_calls()
+        finally:
+            # Calls after a user input request never run, so drop their early starts
+            self._cancel_pending_tool_tasks()
+
+    async def _act_on_tool_calls(self) -> Union[str, Dict[str, Any]]:
+        """Execute the current tool calls in batches, stopping at user input"""
         results = []
-        for command in self.tool_calls:
-            result = await self.execute_tool(command)
-            
-            # Special handling for tools requiring user input
-            if isinstance(result, dict) and result.get("requires_user_response", False):
-                # Add tool response to memory
-                tool_msg = Message.tool_message(
-                    content=str(result), tool_call_id=command.id, name=command.function.name
-                )
-                self.memory.add_message(tool_msg)
-                
-                # Return the result directly to trigger user input
-                return result
+        tool_msgs: List[Message] = []
+        for batch in self._batch_tool_calls(self.tool_calls):
+            batch_results = await asyncio.gather(
+                *(self._run_tool_call(command) for command in batch),
+                return_exceptions=True,
+            )
 
-            if self.max_observe:
-                result = result[: self.max_observe]
+            # Record results in the original call order
+            for command, outcome in zip(batch, batch_results):
+                if isinstance(outcome, BaseException):
+                    error = f"Error: {TOOL_ERROR.format(command.function.name, outcome)}"
+                    outcome = (_truncate(error, self.max_observe), False)
+                result, needs_input = outcome
+
+                # Special handling for tools requiring user input
+                if needs_input:
+                    # Add tool responses so far to memory
+                    tool_msgs.append(
+                        Message.tool_message(
+                            content=_dump_result(result),
+                            tool_call_id=command.id,
+                            name=command.function.name,
+                        )
+                    )
+                    self.memory.add_messages(tool_msgs)
 
-            logger.info(
-                f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
-            )
+                    # Return the result directly to trigger user input
+                    return result
 
-            # Add tool response to memory
-            tool_msg = Message.tool_message(
-                content=result, tool_call_id=command.id, name=command.function.name
-            )
-            self.memory.add_message(tool_msg)
-            results.append(result)
+                logger.opt(lazy=True).info(
+                    "🎯 Tool '{}' completed its mission! Result: {}",
+                    lambda: command.function.name,
+                    lambda: result,
+                )
+
+                tool_msgs.append(
+                    Message.tool_message(
+                        content=result, tool_call_id=command.id, name=command.function.name
+                    )
+                )
+                results.append(result)
 
+        # Add all tool responses to memory at once
+        self.memory.add_messages(tool_msgs)
         return "\n\n".join(results)
 
-    async def execute_tool(self, command: ToolCall) -> Union[str, Dict[str, Any]]:
-        """Execute a single tool call with robust error handling"""
+    def _get_next_step_message(self) -> Message:
+        """Return the next step message, rebuilt only when the next step prompt changes"""
+        if (
+            self._next_step_msg_cache is None
+            or self._next_step_msg_cache.content != self.next_step_prompt
+        ):
+            self._next_step_msg_cache = Message.user_message(self.next_step_prompt)
+        return self._next_step_msg_cache
+
+    def _run_tool_call(self, command: ToolCall) -> Awaitable[ToolOutcome]:
+        """Return the pending result of a tool call, reusing one started while streaming"""
+        pending = self._pending_tool_tasks.pop(id(command), None)
+        if pending is not None and pending[0] is command:
+            return pending[1]
+        return self.execute_tool(command, max_observe=self.max_observe)
+
+    async def _stream_tool_calls(self, system_msgs: Optional[List[Message]]) -> Message:
+        """Stream the LLM response, starting parallel-safe tool calls as they complete.
+
+        Starting stops at the first call that is not parallel-safe (e.g. a
+        special tool like `ask_user`), leaving it and every later call for `act`
+        so they keep their sequential semantics.
+
+        Returns:
+            Message: The assembled assistant response
+        """
+        self._cancel_pending_tool_tasks()
+
+        content: List[str] = []
+        tool_calls: List[ToolCall] = []
+        dispatching = self.tool_choices != ToolChoice.NONE
+        async for item in self.llm.ask_tool_stream(
+            messages=self.messages,
+            system_msgs=system_msgs,
+            tools=self._get_tool_params(),
+            tool_choice=self.tool_choices,
+        ):
+            if isinstance(item, str):
+                content.append(item)
+                continue
+
+            tool_calls.append(item)
+            dispatching = dispatching and self._is_parallel_safe(item)
+            if dispatching:
+                logger.info(f"⚡ Starting tool '{item.function.name}' while streaming")
+                self._pending_tool_tasks[id(item)] = (
+                    item,
+                    asyncio.create_task(
+                        self.execute_tool(item, max_observe=self.max_observe)
+                    ),
+                )
+
+        return Message.from_llm_response(
+            content="".join(content) or None, tool_calls=tool_calls
+        )
+
+    def _cancel_pending_tool_tasks(self) -> None:
+        """Cancel tool calls started while streaming that `act` did not consume"""
+        for _, task in self._pending_tool_tasks.values():
+            task.cancel()
+        self._pending_tool_tasks.clear()
+
+    def _batch_tool_calls(self, tool_calls: List[ToolCall]) -> List[List[ToolCall]]:
+        """Group tool calls into batches that can be executed concurrently.
+
+        Consecutive calls to parallel-safe tools share a batch. Every other call,
+        including special tools (e.g. `terminate`, `ask_user`), runs in a batch
+        of its own, so calls that depend on each other or share state keep
+        their sequential order.
+        """
+        batches: List[List[ToolCall]] = []
+        current: List[ToolCall] = []
+        for command in tool_calls:
+            if self._is_parallel_safe(command):
+                current.append(command)
+                continue
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([command])
+        if current:
+            batches.append(current)
+        return batches
+
+    def _is_parallel_safe(self, command: ToolCall) -> bool:
+        """Check whether a tool call may run concurrently with its neighbours"""
+        name = command.function.name if command and command.function else ""
+        tool = self.available_tools.get_tool(name) if name else None
+        return (
+            tool is not None
+            and tool.parallel_safe
+            and not self._is_special_tool(name)
+        )
+
+    async def execute_tool(
+        self, command: ToolCall, max_observe: Optional[Union[int, bool]] = None
+    ) -> ToolOutcome:
+        """Execute a single tool call with robust error handling
+
+        Args:
+            command: The tool call to execute
+            max_observe: Optional maximum size of the tool output in the observation,
+                in UTF-8 bytes
+
+        Returns:
+            ToolOutcome: The observation string, or the raw result dict for tools
+                requiring user input, and whether user input is required
+        """
         if not command or not command.function or not command.function.name:
-            return "Error: Invalid command format"
+            return _truncate("Error: Invalid command format", max_observe), False
 
         name = command.function.name
         if name not in self.available_tools.tool_map:
-            return f"Error: Unknown tool '{name}'"
+            return _truncate(f"Error: Unknown tool '{name}'", max_observe), False
 
         try:
             # Parse arguments
-            args = json.loads(command.function.arguments or "{}")
+            args = _parse_arguments(command.function.arguments or "{}")
 
             # Execute the tool
             logger.info(f"🔧 Activating tool: '{name}'...")
@@ -203,12 +442,12 @@ class ToolCallAgent(ReActAgent):
 
             # If the tool result is a dictionary and contains requires_user_response flag,
             # return it directly to trigger user input handling
-            if isinstance(result, dict) and result.get("requires_user_response", False):
-                return result
+            if _needs_user_input(result):
+                return result, True
 
             # Format result for display
             observation = (
-                f"Observed output of cmd `{name}` executed:\n{str(result)}"
+                f"Observed output of cmd `{name}` executed:\n{_truncate(str(result), max_observe)}"
                 if result
                 else f"Cmd `{name}` completed with no output"
             )
@@ -216,17 +455,18 @@ class ToolCallAgent(ReActAgent):
             # Handle special tools like `finish`
             await self._handle_special_tool(name=name, result=result)
 
-            return observation
+            return observation, False
         except json.JSONDecodeError:
             error_msg = f"Error parsing arguments for {name}: Invalid JSON format"
             logger.error(
-                f"📝 Oops! The arguments for '{name}' don't make sense - invalid JSON, arguments:{command.function.arguments}"
+                "📝 Oops! The arguments for '{}' don't make sense - invalid JSON, arguments:{}",
+                name,
+                command.function.arguments,
             )
-            return f"Error: {error_msg}"
+            return _truncate(f"Error: {error_msg}", max_observe), False
         except Exception as e:
-            error_msg = f"⚠️ Tool '{name}' encountered a problem: {str(e)}"
-            logger.error(error_msg)
-            return f"Error: {error_msg}"
+            logger.error(TOOL_ERROR, name, e)
+            return _truncate(f"Error: {TOOL_ERROR.format(name, e)}", max_observe), False
 
     async def _handle_special_tool(self, name: str, result: Any, **kwargs):
         """Handle special tool execution and state changes"""
@@ -251,118 +491,14 @@ class ToolCallAgent(ReActAgent):
 
     def _is_special_tool(self, name: str) -> bool:
         """Check if tool name is in special tools list"""
-        return name.lower() in [n.lower() for n in self.special_tool_names]
-
-    def _is_asking_question(self, text: str) -> bool:
-        """
-        Detects if the given text is asking a question or requesting input from the user.
-        
-        Args:
-            text: The text to analyze
-            
-        Returns:
-            bool: True if the text appears to be asking for user input
-        """
-        # Skip status/information messages that just happen to contain question patterns
-        if text.startswith("I successfully") or "sum of" in text.lower() or "sum is" in text.lower():
-            return False
-            
-        # Check for question marks
-        if "?" in text:
-            return True
-            
-        # Common question patterns
-        question_patterns = [
-            r"(?i)would you like",
-            r"(?i)do you want",
-            r"(?i)can you",
-            r"(?i)could you",
-            r"(?i)please provide",
-            r"(?i)please let me know",
-            r"(?i)please specify",
-            r"(?i)tell me",
-            r"(?i)what.*(?:would|should|can|could)",
-            r"(?i)how.*(?:would|should|can|could)",
-            r"(?i)which.*(?:option|choice)",
-            # Don't treat "if you need any further assistance, let me know" as a question
-            # r"(?i)let me know",
-            r"(?i)if you have",
-            r"(?i)if you would like",
-        ]
-        
-        for pattern in question_patterns:
-            if re.search(pattern, text):
-                # Don't treat closing statements as questions
-                if pattern == r"(?i)please let me know" and ("if you need" in text.lower() or "further assistance" in text.lower()):
-                    return False
-                return True
-                
-        return False
-
-    # Add this method to handle safe conversion to ask_user tool
-    def _create_ask_user_tool_call(self, question_text: str) -> List[ToolCall]:
-        """
-        Safely create an ask_user tool call from a question text.
-        
-        Args:
-            question_text: The text of the question
-            
-        Returns:
-            List[ToolCall]: A list containing the ask_user tool call
-        """
-        try:
-            # Trim question text if too long to prevent JSON serialization issues
-            max_length = 500
-            if len(question_text) > max_length:
-                question_text = question_text[:max_length] + "..."
-                
-            # Sanitize question text for JSON 
-            # Replace newlines with spaces and escape quotes for JSON safety
-            question_text = question_text.replace('\n', ' ').replace('\r', ' ')
-            
-            # Create the arguments as a proper Python dictionary first
-            args = {
-                "question": question_text,
-                "dangerous_action": False,
-                "question_type": "follow-up"
-            }
-            
-            # Convert to JSON with error handling
-            try:
-                args_json = json.dumps(args)
-            except Exception as json_err:
-                logger.error(f"JSON serialization error: {str(json_err)}, using simplified question")
-                # Try with simpler text if JSON fails
-                args = {
-                    "question": "I need more information to proceed. Please provide details.",
-                    "dangerous_action": False,
-                    "question_type": "follow-up"
-                }
-                args_json = json.dumps(args)
-                
-            # Create the function object using the schema's Function class
-            try:
-                function_obj = Function(
-                    name="ask_user",
-                    arguments=args_json
-                )
-            except Exception as func_err:
-                logger.error(f"Error creating Function object: {str(func_err)}, {type(func_err)}")
-                return []
-                
-            # Create the full tool call
-            try:
-                ask_user_tool = ToolCall(
-                    id="auto_ask_user",
-                    type="function",
-                    function=function_obj
-                )
-                return [ask_user_tool]
-            except Exception as tool_err:
-                logger.error(f"Error creating ToolCall object: {str(tool_err)}, {type(tool_err)}")
-                return []
-                
-        except Exception as e:
-            logger.error(f"Error creating ask_user tool call: {str(e)}, {type(e)}")
-            logger.error(f"Question text causing error: '{question_text[:100]}...'")
-            return []
+        names = tuple(self.special_tool_names)
+        if (
+            self._special_tool_names_cache is None
+            or self._special_tool_names_cache[0] != names
+        ):
+            # Lowercase once per change of the list, not on every lookup
+            self._special_tool_names_cache = (
+                names,
+                frozenset(n.lower() for n in names),
+            )
+        return name.lower() in self._special_tool_names_cache[1]
@@ -1,4 +1,6 @@
-from typing import Dict, List, Optional, Union
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import orjson
 
 import tiktoken
 from openai import (
@@ -23,7 +25,9 @@ from app.schema import (
     ROLE_VALUES,
     TOOL_CHOICE_TYPE,
     TOOL_CHOICE_VALUES,
+    Function,
     Message,
+    ToolCall,
     ToolChoice,
 )
 
@@ -313,6 +317,80 @@ class LLM:
             logger.error(f"Unexpected error in ask: {e}")
             raise
 
+    def _build_tool_params(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        **kwargs,
+    ) -> Tuple[dict, int]:
+        """
+        Validate a tool request and build the completion parameters for it.
+
+        Returns:
+            Tuple[dict, int]: The completion parameters and the input token count
+
+        Raises:
+            TokenLimitExceeded: If token limits are exceeded
+            ValueError: If tools, tool_choice, or messages are invalid
+        """
+        # Validate tool_choice
+        if tool_choice not in TOOL_CHOICE_VALUES:
+            raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+        # Format messages
+        if system_msgs:
+            system_msgs = self.format_messages(system_msgs)
+            messages = system_msgs + self.format_messages(messages)
+        else:
+            messages = self.format_messages(messages)
+
+        # Calculate input token count
+        input_tokens = self.count_message_tokens(messages)
+
+        # If there are tools, calculate token count for tool descriptions
+        tools_tokens = 0
+        if tools:
+            for tool in tools:
+                tools_tokens += self.count_tokens(str(tool))
+
+        input_tokens += tools_tokens
+
+        # Check if token limits are exceeded
+        if not self.check_token_limit(input_tokens):
+            error_message = self.get_limit_error_message(input_tokens)
+            # Raise a special exception that won't be retried
+            raise TokenLimitExceeded(error_message)
+
+        # Validate tools if provided
+        if tools:
+            for tool in tools:
+                if not isinstance(tool, dict) or "type" not in tool:
+                    raise ValueError("Each tool must be a dict with 'type' field")
+
+        # Set up the completion request
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "timeout": timeout,
+            **kwargs,
+        }
+
+        if self.model in REASONING_MODELS:
+            params["max_completion_tokens"] = self.max_tokens
+        else:
+            params["max_tokens"] = self.max_tokens
+            params["temperature"] = (
+                temperature if temperature is not None else self.temperature
+            )
+
+        return params, input_tokens
+
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -352,57 +430,15 @@ class LLM:
             Exception: For unexpected errors
         """
         try:
-            # Validate tool_choice
-            if tool_choice not in TOOL_CHOICE_VALUES:
-                raise ValueError(f"Invalid tool_choice: {tool_choice}")
-
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs)
-                messages = system_msgs + self.format_messages(messages)
-            else:
-                messages = self.format_messages(messages)
-
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
-
-            # If there are tools, calculate token count for tool descriptions
-            tools_tokens = 0
-            if tools:
-                for tool in tools:
-                    tools_tokens += self.count_tokens(str(tool))
-
-            input_tokens += tools_tokens
-
-            # Check if token limits are exceeded
-            if not self.check_token_limit(input_tokens):
-                error_message = self.get_limit_error_message(input_tokens)
-                # Raise a special exception that won't be retried
-                raise TokenLimitExceeded(error_message)
-
-            # Validate tools if provided
-            if tools:
-                for tool in tools:
-                    if not isinstance(tool, dict) or "type" not in tool:
-                        raise ValueError("Each tool must be a dict with 'type' field")
-
-            # Set up the completion request
-            params = {
-                "model": self.model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": tool_choice,
-                "timeout": timeout,
+            params, _ = self._build_tool_params(
+                messages=messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
                 **kwargs,
-            }
-
-            if self.model in REASONING_MODELS:
-                params["max_completion_tokens"] = self.max_tokens
-            else:
-                params["max_tokens"] = self.max_tokens
-                params["temperature"] = (
-                    temperature if temperature is not None else self.temperature
-                )
+            )
 
             response = await self.client.chat.completions.create(**params)
 
@@ -434,3 +470,131 @@ class LLM:
         except Exception as e:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
+
+    async def ask_tool_stream(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[Union[str, ToolCall]]:
+        """
+        Ask LLM using functions/tools and stream the response.
+
+        Content deltas are yielded as strings. Each tool call is yielded as a
+        `ToolCall` as soon as its arguments form complete JSON, or once the model
+        moves on to the next tool call, so callers can start executing it while
+        the rest of the response is still being generated. Tool calls are always
+        yielded in the order the model produced them.
+
+        Unlike `ask_tool`, failed requests are not retried, since tool calls
+        yielded before the failure may already be running.
+
+        Args:
+            messages: List of conversation messages
+            system_msgs: Optional system messages to prepend
+            timeout: Request timeout in seconds
+            tools: List of tools to use
+            tool_choice: Tool choice strategy
+            temperature: Sampling temperature for the response
+            **kwargs: Additional completion arguments
+
+        Yields:
+            Union[str, ToolCall]: Content deltas and completed tool calls
+
+        Raises:
+            TokenLimitExceeded: If token limits are exceeded
+            ValueError: If tools, tool_choice, or messages are invalid
+            OpenAIError: If API call fails
+            Exception: For unexpected errors
+        """
+        try:
+            params, input_tokens = self._build_tool_params(
+                messages=messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                **kwargs,
+            )
+
+            # For streaming, update estimated token count before making the request
+            self.update_token_count(input_tokens)
+
+            params["stream"] = True
+            response = await self.client.chat.completions.create(**params)
+
+            calls: Dict[int, dict] = {}
+            next_index = 0
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                if delta.content:
+                    yield delta.content
+
+                for call_delta in delta.tool_calls or []:
+                    call = calls.setdefault(
+                        call_delta.index, {"id": "", "name": "", "arguments": ""}
+                    )
+                    if call_delta.id:
+                        call["id"] = call_delta.id
+                    if call_delta.function:
+                        call["name"] += call_delta.function.name or ""
+                        call["arguments"] += call_delta.function.arguments or ""
+
+                # A tool call is complete once its arguments parse, or once the
+                # model has started on a later tool call
+                while next_index in calls and (
+                    max(calls) > next_index
+                    or self._is_complete_json(calls[next_index]["arguments"])
+                ):
+                    yield self._to_tool_call(calls[next_index])
+                    next_index += 1
+
+            for index in sorted(calls):
+                if index >= next_index:
+                    yield self._to_tool_call(calls[index])
+
+        except TokenLimitExceeded:
+            # Re-raise token limit errors without logging
+            raise
+        except ValueError as ve:
+            logger.error(f"Validation error in ask_tool_stream: {ve}")
+            raise
+        except OpenAIError as oe:
+            logger.error(f"OpenAI API error: {oe}")
+            if isinstance(oe, AuthenticationError):
+                logger.error("Authentication failed. Check API key.")
+            elif isinstance(oe, RateLimitError):
+                logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+            elif isinstance(oe, APIError):
+                logger.error(f"API error: {oe}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in ask_tool_stream: {e}")
+            raise
+
+    @staticmethod
+    def _is_complete_json(arguments: str) -> bool:
+        """Check whether streamed tool call arguments form a complete JSON object"""
+        if not arguments.rstrip().endswith("}"):
+            return False
+        try:
+            orjson.loads(arguments)
+        except orjson.JSONDecodeError:
+            return False
+        return True
+
+    @staticmethod
+    def _to_tool_call(call: dict) -> ToolCall:
+        """Build a ToolCall from accumulated tool call deltas"""
+        return ToolCall(
+            id=call["id"],
+            function=Function(name=call["name"], arguments=call["arguments"]),
+        )
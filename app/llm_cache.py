@@ -0,0 +1,208 @@
+"""Response cache for LLM tool calls."""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.llm import LLM
+from app.logger import logger
+from app.schema import TOOL_CHOICE_TYPE, Message, ToolChoice
+
+
+EmbedFn = Callable[[str], Sequence[float]]
+
+# Embedders ignore text beyond their context window, so only a prefix is used
+EMBED_TEXT_LIMIT = 512
+EMBED_CACHE_SIZE = 2048
+
+
+class LLMResponseCache:
+    """Two-tier LRU cache for `LLM.ask_tool` responses.
+
+    The exact tier is keyed by a SHA-256 digest of the full request. The
+    semantic tier is only used when an embedding function is supplied: it
+    matches the last user query by cosine similarity, within a scope made of
+    the endpoint, model, sampling options, tool schema, tool choice and the
+    rest of the conversation.
+    """
+
+    def __init__(self, maxsize: int = 512, similarity_threshold: float = 0.87):
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self._exact: "OrderedDict[str, Any]" = OrderedDict()
+        self._semantic: "OrderedDict[str, Tuple[str, np.ndarray]]" = OrderedDict()
+        # Embeddings by text, valid for `_embed_fn` only
+        self._embed_fn: Optional[EmbedFn] = None
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def embed(self, embed_fn: EmbedFn, text: str) -> np.ndarray:
+        """Embed and L2-normalize text, memoized across retries and repeated steps"""
+        if embed_fn is not self._embed_fn:
+            # Vectors from different embedders can't be compared, so start over
+            self._embed_fn = embed_fn
+            self._embeddings.clear()
+            self._semantic.clear()
+
+        text = text[:EMBED_TEXT_LIMIT]
+        vector = self._embeddings.get(text)
+        if vector is not None:
+            self._embeddings.move_to_end(text)
+            return vector
+
+        vector = np.asarray(embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        # The same array is returned for every hit, so guard it against mutation
+        vector.setflags(write=False)
+        self._embeddings[text] = vector
+        while len(self._embeddings) > EMBED_CACHE_SIZE:
+            self._embeddings.popitem(last=False)
+        return vector
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the response cached under an exact key, if any"""
+        if key not in self._exact:
+            return None
+        self._exact.move_to_end(key)
+        return self._exact[key]
+
+    def get_similar(self, scope: str, embedding: np.ndarray) -> Optional[Any]:
+        """Return the most similar cached response within the same scope"""
+        keys = [key for key, (s, _) in self._semantic.items() if s == scope]
+        if not keys:
+            return None
+
+        vectors = np.stack([self._semantic[key][1] for key in keys])
+        scores = vectors @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self.get(keys[best])
+
+    def put(
+        self,
+        key: str,
+        response: Any,
+        scope: Optional[str] = None,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        """Store a response in the exact tier and, if embedded, the semantic tier"""
+        self._exact[key] = response
+        self._exact.move_to_end(key)
+        if scope is not None and embedding is not None:
+            self._semantic[key] = (scope, embedding)
+            self._semantic.move_to_end(key)
+
+        while len(self._exact) > self.maxsize:
+            evicted, _ = self._exact.popitem(last=False)
+            self._semantic.pop(evicted, None)
+
+    def clear(self) -> None:
+        """Clear both tiers and the memoized embeddings"""
+        self._exact.clear()
+        self._semantic.clear()
+        self._embed_fn = None
+        self._embeddings.clear()
+
+
+default_cache = LLMResponseCache()
+
+
+def _digest(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _split_query(
+    messages: List[dict], ignored_prompt: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Split out the content of the last user message that is a real query.
+
+    User messages equal to `ignored_prompt` are skipped. The query's content is
+    blanked in the returned messages, which then describe everything around it.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        content = message.get("content")
+        if message.get("role") == "user" and content and content != ignored_prompt:
+            context = list(messages)
+            context[index] = {**message, "content": None}
+            return context, content
+    return messages, None
+
+
+async def cached_ask_tool(
+    llm: LLM,
+    messages: List[Union[dict, Message]],
+    system_msgs: Optional[List[Union[dict, Message]]] = None,
+    tools: Optional[List[dict]] = None,
+    tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+    embed_fn: Optional[EmbedFn] = None,
+    cache: Optional[LLMResponseCache] = None,
+    ignored_prompt: Optional[str] = None,
+    **kwargs,
+):
+    """
+    Call `llm.ask_tool`, serving identical (or, with `embed_fn`, similar)
+    requests from the cache.
+
+    Args:
+        llm: The LLM instance to query on a cache miss
+        messages: List of conversation messages
+        system_msgs: Optional system messages to prepend
+        tools: List of tools to use
+        tool_choice: Tool choice strategy
+        embed_fn: Optional function embedding text, enables the semantic tier
+        cache: Cache to use, defaults to the module-level cache
+        ignored_prompt: User prompt repeated every step (e.g. the next step
+            prompt), never used as the semantic query
+        **kwargs: Additional arguments passed to `ask_tool`
+
+    Returns:
+        ChatCompletionMessage: The model's response, possibly from the cache
+    """
+    cache = cache if cache is not None else default_cache
+
+    formatted = LLM.format_messages((system_msgs or []) + list(messages))
+    # Everything besides the messages that can change the response
+    options = dict(kwargs)
+    if options.get("temperature") is None:
+        options["temperature"] = getattr(llm, "temperature", None)
+    request = {
+        "api_type": getattr(llm, "api_type", None),
+        "base_url": getattr(llm, "base_url", None),
+        "model": llm.model,
+        "options": options,
+        "tools": tools,
+        "tool_choice": tool_choice,
+    }
+    key = _digest({**request, "messages": formatted})
+
+    response = cache.get(key)
+    if response is not None:
+        logger.info("♻️ Serving LLM response from exact-match cache")
+        return response
+
+    scope = embedding = None
+    if embed_fn is not None:
+        context, query = _split_query(formatted, ignored_prompt)
+        if query:
+            scope = _digest({**request, "messages": context})
+            embedding = cache.embed(embed_fn, query)
+            response = cache.get_similar(scope, embedding)
+            if response is not None:
+                logger.info("♻️ Serving LLM response from semantic cache")
+                return response
+
+    response = await llm.ask_tool(
+        messages=messages,
+        system_msgs=system_msgs,
+        tools=tools,
+        tool_choice=tool_choice,
+        **kwargs,
+    )
+    cache.put(key, response, scope=scope, embedding=embedding)
+    return response
@@ -133,6 +133,32 @@ class Message(BaseModel):
             role=Role.ASSISTANT, content=content, tool_calls=formatted_calls, **kwargs
         )
 
+    @classmethod
+    def from_llm_response(
+        cls, content: Optional[str] = None, tool_calls: Optional[List[Any]] = None
+    ) -> "Message":
+        """Create an assistant message from an LLM response without revalidation.
+
+        Args:
+            content: Optional message content
+            tool_calls: Tool calls returned by the LLM client, or ToolCall objects
+        """
+        formatted_calls = [
+            call
+            if isinstance(call, ToolCall)
+            else ToolCall.model_construct(
+                id=call.id,
+                type="function",
+                function=Function.model_construct(
+                    name=call.function.name, arguments=call.function.arguments
+                ),
+            )
+            for call in tool_calls or []
+        ]
+        return cls.model_construct(
+            role=Role.ASSISTANT, content=content, tool_calls=formatted_calls or None
+        )
+
 
 class Memory(BaseModel):
     messages: List[Message] = Field(default_factory=list)
@@ -148,6 +174,8 @@ class Memory(BaseModel):
     def add_messages(self, messages: List[Message]) -> None:
         """Add multiple messages to memory"""
         self.messages.extend(messages)
+        if len(self.messages) > self.max_messages:
+            self.messages = self.messages[-self.max_messages :]
 
     def clear(self) -> None:
         """Clear all messages"""
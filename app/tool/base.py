@@ -8,6 +8,10 @@ class BaseTool(ABC, BaseModel):
     name: str
     description: str
     parameters: Optional[dict] = None
+    # Whether calls may run concurrently with other parallel-safe calls. Only
+    # tools without shared state or side effects other calls may depend on
+    # should set this.
+    parallel_safe: bool = False
 
     class Config:
         arbitrary_types_allowed = True
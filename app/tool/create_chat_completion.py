@@ -7,6 +7,7 @@ from app.tool import BaseTool
 
 class CreateChatCompletion(BaseTool):
     name: str = "create_chat_completion"
+    parallel_safe: bool = True
     description: str = (
         "Creates a structured completion with specified output formatting."
     )
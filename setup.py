@@ -35,6 +35,8 @@ setup(
         "googlesearch-python~=1.3.0",
         "pydantic_core~=2.27.2",
         "colorama~=0.4.6",
+        "orjson~=3.10",
+        "pyahocorasick~=2.1",
     ],
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,77 @@
+"""Tests for streaming tool calls from the LLM wrapper."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.llm import LLM
+
+
+def chunk(content=None, index=None, call_id=None, name=None, arguments=None):
+    """Build a streamed completion chunk with an optional tool call delta."""
+    tool_calls = None
+    if index is not None:
+        function = SimpleNamespace(name=name, arguments=arguments)
+        tool_calls = [SimpleNamespace(index=index, id=call_id, function=function)]
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeCompletions:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def create(self, **params):
+        assert params["stream"]
+
+        async def stream():
+            for item in self.chunks:
+                yield item
+
+        return stream()
+
+
+@pytest.fixture
+def llm():
+    """Create an LLM with a whitespace tokenizer and no real client."""
+    instance = object.__new__(LLM)
+    instance.model = "fake-model"
+    instance.max_tokens = 100
+    instance.temperature = 0.0
+    instance.total_input_tokens = 0
+    instance.max_input_tokens = None
+    instance.tokenizer = SimpleNamespace(encode=str.split)
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_ask_tool_stream_yields_tool_calls_as_they_complete(llm):
+    """Test that each tool call is yielded once complete and in order."""
+    llm.client = SimpleNamespace(
+        chat=SimpleNamespace(
+            completions=FakeCompletions(
+                [
+                    chunk(content="Working on it"),
+                    chunk(index=0, call_id="call_0", name="search", arguments='{"q": '),
+                    chunk(index=0, arguments='"cats"}'),
+                    chunk(content="marker"),
+                    chunk(index=1, call_id="call_1", name="bad", arguments="{oops"),
+                    chunk(index=2, call_id="call_2", name="terminate", arguments=""),
+                ]
+            )
+        )
+    )
+
+    items = [
+        item
+        async for item in llm.ask_tool_stream(
+            messages=[{"role": "user", "content": "Find cats"}],
+            tools=[{"type": "function", "function": {"name": "search"}}],
+        )
+    ]
+
+    assert items[0] == "Working on it"
+    assert items[1].id == "call_0"
+    assert items[1].function.arguments == '{"q": "cats"}'
+    assert items[2] == "marker"
+    assert [item.id for item in items[3:]] == ["call_1", "call_2"]
+    assert items[3].function.arguments == "{oops"
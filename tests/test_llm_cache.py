@@ -0,0 +1,223 @@
+"""Tests for the LLM response cache."""
+from dataclasses import dataclass
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.llm import LLM
+from app.llm_cache import LLMResponseCache, cached_ask_tool, default_cache
+from app.schema import Message
+
+
+class FakeLLM:
+    """Minimal stand-in for `LLM` that counts `ask_tool` calls."""
+
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ask_tool(self, **kwargs):
+        self.calls += 1
+        return f"response {self.calls}"
+
+
+def embed(text: str):
+    """Embed text as a bag of two keywords."""
+    return [text.count("weather"), text.count("stock")]
+
+
+@pytest.mark.asyncio
+async def test_exact_tier_serves_identical_requests():
+    """Test that an identical request is answered without calling the LLM."""
+    llm, cache = FakeLLM(), LLMResponseCache()
+    messages = [Message.user_message("Hello")]
+
+    first = await cached_ask_tool(llm, messages=messages, tools=[], cache=cache)
+    second = await cached_ask_tool(llm, messages=messages, tools=[], cache=cache)
+    other = await cached_ask_tool(
+        llm, messages=[Message.user_message("Bye")], tools=[], cache=cache
+    )
+
+    assert first == second == "response 1"
+    assert other == "response 2"
+    assert llm.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_semantic_tier_respects_tool_schema():
+    """Test that similar requests hit only when the tool schema is unchanged."""
+    llm, cache = FakeLLM(), LLMResponseCache()
+    tools = [{"type": "function", "function": {"name": "search"}}]
+
+    await cached_ask_tool(
+        llm,
+        messages=[Message.user_message("What is the weather?")],
+        tools=tools,
+        embed_fn=embed,
+        cache=cache,
+    )
+    similar = await cached_ask_tool(
+        llm,
+        messages=[Message.user_message("Tell me the weather")],
+        tools=tools,
+        embed_fn=embed,
+        cache=cache,
+    )
+    unrelated = await cached_ask_tool(
+        llm,
+        messages=[Message.user_message("Check the stock price")],
+        tools=tools,
+        embed_fn=embed,
+        cache=cache,
+    )
+    other_tools = await cached_ask_tool(
+        llm,
+        messages=[Message.user_message("Tell me the weather")],
+        tools=[],
+        embed_fn=embed,
+        cache=cache,
+    )
+
+    assert similar == "response 1"
+    assert unrelated == "response 2"
+    assert other_tools == "response 3"
+
+
+def test_cache_evicts_least_recently_used():
+    """Test that the cache keeps at most `maxsize` entries."""
+    cache = LLMResponseCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_memoized():
+    """Test that repeated lookups for the same text embed it only once."""
+    llm, cache = FakeLLM(), LLMResponseCache()
+    embedded = []
+
+    def counting_embed(text: str):
+        embedded.append(text)
+        return embed(text)
+
+    for tools in ([], [{"type": "function", "function": {"name": "search"}}]):
+        await cached_ask_tool(
+            llm,
+            messages=[Message.user_message("What is the weather?")],
+            tools=tools,
+            embed_fn=counting_embed,
+            cache=cache,
+        )
+
+    assert embedded == ["What is the weather?"]
+    assert llm.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_exact_tier_separates_endpoints_and_sampling_options():
+    """Test that requests differing only in endpoint or options miss the cache."""
+    llm, other_llm, cache = FakeLLM(), FakeLLM(), LLMResponseCache()
+    other_llm.base_url = "https://other.example.com/v1"
+    messages = [Message.user_message("Hello")]
+
+    await cached_ask_tool(llm, messages=messages, tools=[], cache=cache)
+    await cached_ask_tool(other_llm, messages=messages, tools=[], cache=cache)
+    await cached_ask_tool(
+        llm, messages=messages, tools=[], temperature=1.0, cache=cache
+    )
+    await cached_ask_tool(llm, messages=messages, tools=[], top_p=0.5, cache=cache)
+
+    assert llm.calls == 3
+    assert other_llm.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_tier_matches_queries_through_think():
+    """Test that similar queries hit despite the trailing next step prompt."""
+    default_cache.clear()
+    calls = []
+
+    async def ask_tool(**kwargs):
+        calls.append(kwargs)
+        return Message.assistant_message(f"response {len(calls)}")
+
+    def make_agent(query: str) -> ToolCallAgent:
+        llm = object.__new__(LLM)
+        llm.model = "fake-model"
+        llm.ask_tool = ask_tool
+        agent = ToolCallAgent(llm=llm, use_llm_cache=True, embed_fn=embed)
+        agent.memory.add_message(Message.user_message(query))
+        return agent
+
+    first = make_agent("What is the weather?")
+    similar = make_agent("Tell me the weather")
+    unrelated = make_agent("Check the stock price")
+    for agent in (first, similar, unrelated):
+        await agent.think()
+
+    assert len(calls) == 2
+    assert similar.messages[-1].content == "response 1"
+    assert unrelated.messages[-1].content == "response 2"
+
+
+@pytest.mark.asyncio
+async def test_semantic_scope_covers_messages_after_query():
+    """Test that a query only matches when the conversation after it is the same."""
+    llm, cache = FakeLLM(), LLMResponseCache()
+    prompt = "What next?"
+
+    for query, reply in (
+        ("What is the weather?", ""),
+        ("Tell me the weather", ""),
+        ("Tell me the weather", "Found it"),
+    ):
+        messages = [Message.user_message(query)]
+        if reply:
+            messages.append(Message.assistant_message(reply))
+        messages.append(Message.user_message(prompt))
+        await cached_ask_tool(
+            llm,
+            messages=messages,
+            tools=[],
+            embed_fn=embed,
+            cache=cache,
+            ignored_prompt=prompt,
+        )
+
+    assert llm.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_unhashable_embedders_are_supported():
+    """Test that embedders need not be hashable, and switching them resets state."""
+
+    @dataclass
+    class Embedder:
+        scale: float = 1.0
+
+        def __call__(self, text: str):
+            return [self.scale * value for value in embed(text)]
+
+    llm, cache = FakeLLM(), LLMResponseCache()
+    embedder = Embedder()
+    for embed_fn, query in (
+        (embedder, "What is the weather?"),
+        (embedder, "Tell me the weather"),
+        (Embedder(2.0), "Weather, please"),
+    ):
+        await cached_ask_tool(
+            llm,
+            messages=[Message.user_message(query)],
+            tools=[],
+            embed_fn=embed_fn,
+            cache=cache,
+        )
+
+    assert llm.calls == 2
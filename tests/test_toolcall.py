@@ -0,0 +1,382 @@
+"""Tests for tool call execution in the ToolCallAgent."""
+import asyncio
+import json
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.llm import LLM
+from app.schema import Function, Message, ToolCall
+from app.tool import Terminate, ToolCollection
+from app.tool.ask_user import AskUser
+from app.tool.base import BaseTool
+
+
+class SleepTool(BaseTool):
+    """A tool that sleeps for a while and echoes its input."""
+
+    name: str = "sleep"
+    description: str = "Sleep and echo the given text."
+    parallel_safe: bool = True
+    parameters: dict = {
+        "type": "object",
+        "properties": {"text": {"type": "string"}, "delay": {"type": "number"}},
+        "required": ["text"],
+    }
+    calls: list = []
+
+    async def execute(self, text: str, delay: float = 0.2) -> str:
+        self.calls.append(text)
+        await asyncio.sleep(delay)
+        return text
+
+
+class StoreTool(BaseTool):
+    """A stateful tool whose calls depend on each other."""
+
+    name: str = "store"
+    description: str = "Set or get a value in a shared store."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"key": {"type": "string"}, "value": {"type": "string"}},
+        "required": ["key"],
+    }
+    values: dict = {}
+
+    async def execute(self, key: str, value: str = None) -> str:
+        if value is None:
+            return f"{key}={self.values.get(key)}"
+        await asyncio.sleep(0.1)
+        self.values[key] = value
+        return f"stored {key}"
+
+
+class ConfirmTool(BaseTool):
+    """A tool requesting user input with a result that is awkward to serialize."""
+
+    name: str = "confirm"
+    description: str = "Ask the user to confirm a choice."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"bits": {"type": "integer"}},
+        "required": ["bits"],
+    }
+
+    async def execute(self, bits: int) -> dict:
+        return {"requires_user_response": True, 1: "first", "value": 2**bits}
+
+
+def make_call(call_id: str, name: str, **args) -> ToolCall:
+    return ToolCall(
+        id=call_id, function=Function(name=name, arguments=json.dumps(args))
+    )
+
+
+@pytest.fixture
+def agent():
+    """Create an agent with a bare LLM instance so no client is needed."""
+    return ToolCallAgent(
+        llm=object.__new__(LLM),
+        available_tools=ToolCollection(
+            SleepTool(), StoreTool(), ConfirmTool(), AskUser(), Terminate()
+        ),
+        special_tool_names=[Terminate().name, AskUser().name],
+    )
+
+
+@pytest.mark.asyncio
+async def test_act_runs_regular_tools_concurrently(agent):
+    """Test that independent tool calls overlap and keep their order in memory."""
+    agent.tool_calls = [
+        make_call(f"call_{i}", "sleep", text=f"result {i}") for i in range(5)
+    ]
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result = await agent.act()
+    elapsed = loop.time() - start
+
+    assert elapsed < 0.2 * 3
+    assert [msg.tool_call_id for msg in agent.messages] == [
+        f"call_{i}" for i in range(5)
+    ]
+    assert result.index("result 0") < result.index("result 4")
+
+
+@pytest.mark.asyncio
+async def test_act_keeps_dependent_tool_calls_in_order(agent):
+    """Test that tools not marked parallel-safe run one after another."""
+    agent.tool_calls = [
+        make_call("call_0", "store", key="path", value="file.py"),
+        make_call("call_1", "store", key="path"),
+    ]
+
+    result = await agent.act()
+
+    assert "path=file.py" in result
+
+
+@pytest.mark.asyncio
+async def test_act_stops_at_user_input_request(agent):
+    """Test that an ask_user call short-circuits the remaining tool calls."""
+    agent.tool_calls = [
+        make_call("call_0", "sleep", text="before", delay=0),
+        make_call("call_1", "ask_user", question="Proceed?"),
+        make_call("call_2", "sleep", text="after", delay=0),
+    ]
+
+    result = await agent.act()
+
+    assert isinstance(result, dict)
+    assert result["requires_user_response"]
+    assert [msg.tool_call_id for msg in agent.messages] == ["call_0", "call_1"]
+    assert json.loads(agent.messages[-1].content)["requires_user_response"]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Do you want to create a file?", True),
+        ("I've calculated the total. Would you like me to create a visualization", True),
+        ("Which option works best for you", True),
+        ("If you have a specific task, please let me know.", True),
+        ("If you need any further assistance, please let me know!", False),
+        ("Could you share the file. If you need help, please let me know.", True),
+        ("The sum of all the numbers is 5656.", False),
+        ("I successfully created the file. Would you like more?", False),
+        ("This is a test string without any question pattern.", False),
+    ],
+)
+def test_is_asking_question(agent, text, expected):
+    """Test that question detection matches the documented patterns."""
+    assert agent._is_asking_question(text) is expected
+
+
+def test_tool_params_follow_tool_collection(agent):
+    """Test that cached tool params are rebuilt when tools or prompts change."""
+    params = agent._get_tool_params()
+    assert agent._get_tool_params() is params
+
+    agent.available_tools.add_tool(Terminate())
+    assert agent._get_tool_params() is not params
+
+    system_msg = agent._get_system_message()
+    assert agent._get_system_message() is system_msg
+
+    agent.system_prompt = "A new prompt"
+    assert agent._get_system_message().content == "A new prompt"
+
+    next_step_msg = agent._get_next_step_message()
+    assert agent._get_next_step_message() is next_step_msg
+
+    agent.handle_stuck_state()
+    assert agent._get_next_step_message().content == agent.next_step_prompt
+
+
+def test_create_ask_user_tool_call(agent):
+    """Test that questions are converted into a well-formed ask_user call."""
+    question = "Which file\nshould I edit? " + "x" * 600
+    tool_calls = agent._create_ask_user_tool_call(question, max_length=500)
+
+    assert len(tool_calls) == 1
+    assert tool_calls[0].function.name == "ask_user"
+    args = json.loads(tool_calls[0].function.arguments)
+    assert args["question"].startswith("Which file should I edit?")
+    assert len(args["question"]) == 503
+    assert args["question_type"] == "follow-up"
+    assert Message.from_tool_calls(tool_calls=tool_calls).tool_calls[0].id == (
+        "auto_ask_user"
+    )
+
+
+@pytest.mark.asyncio
+async def test_act_truncates_tool_output(agent):
+    """Test that max_observe bounds the tool output kept in memory."""
+    agent.max_observe = 10
+    agent.tool_calls = [make_call("call_0", "sleep", text="x" * 100, delay=0)]
+
+    await agent.act()
+
+    assert agent.messages[-1].content.endswith("\n" + "x" * 10)
+
+
+@pytest.mark.asyncio
+async def test_act_truncates_tool_errors(agent):
+    """Test that max_observe also bounds error observations."""
+    agent.max_observe = 50
+    agent.tool_calls = [
+        make_call("call_0", "x" * 100),
+        make_call("call_1", "sleep", delay="y" * 100),
+    ]
+
+    await agent.act()
+
+    assert all(len(msg.content.encode()) <= 50 for msg in agent.messages)
+
+
+@pytest.mark.asyncio
+async def test_act_truncates_multibyte_output_by_bytes(agent):
+    """Test that max_observe counts bytes and never splits a character."""
+    agent.max_observe = 10
+    agent.tool_calls = [make_call("call_0", "sleep", text="日本語のテキスト", delay=0)]
+
+    await agent.act()
+
+    assert agent.messages[-1].content.endswith("\n日本語")
+
+
+@pytest.mark.asyncio
+async def test_streamed_tool_calls_start_before_response_ends(agent):
+    """Test that tools start while the rest of the response is still streaming."""
+
+    async def ask_tool_stream(**kwargs):
+        yield "Let me look into that."
+        yield make_call("call_0", "sleep", text="streamed")
+        await asyncio.sleep(0.2)
+        yield make_call("call_1", "terminate", status="success")
+
+    agent.llm.ask_tool_stream = ask_tool_stream
+    agent.stream_tool_calls = True
+    agent.next_step_prompt = None
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await agent.think()
+    result = await agent.act()
+    elapsed = loop.time() - start
+
+    assert elapsed < 0.35
+    assert "streamed" in result
+    assert [call.id for call in agent.tool_calls] == ["call_0", "call_1"]
+    assert agent.messages[0].content == "Let me look into that."
+
+
+def test_create_ask_user_tool_call_replaces_lone_surrogates(agent):
+    """Test that questions with invalid UTF-8 still serialize."""
+    tool_calls = agent._create_ask_user_tool_call("Keep \ud800 this?")
+
+    assert json.loads(tool_calls[0].function.arguments)["question"] == "Keep ? this?"
+
+
+@pytest.mark.asyncio
+async def test_streamed_tool_calls_after_user_input_never_start(agent):
+    """Test that no tool streamed after an ask_user call is started."""
+    store = agent.available_tools.get_tool("store")
+
+    async def ask_tool_stream(**kwargs):
+        yield make_call("call_0", "ask_user", question="Proceed?")
+        yield make_call("call_1", "store", key="answer", value="yes")
+        yield make_call("call_2", "sleep", text="after", delay=0)
+
+    agent.llm.ask_tool_stream = ask_tool_stream
+    agent.stream_tool_calls = True
+    agent.next_step_prompt = None
+
+    assert await agent.think()
+    result = await agent.act()
+    await asyncio.sleep(0.2)
+
+    assert result["requires_user_response"]
+    assert "answer" not in store.values
+    assert not agent._pending_tool_tasks
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_is_opt_in(agent):
+    """Test that think only serves responses from the cache when enabled."""
+    calls = []
+
+    async def ask_tool(**kwargs):
+        calls.append(kwargs)
+        return Message.assistant_message("Done.")
+
+    agent.llm.model = "fake-model"
+    agent.llm.ask_tool = ask_tool
+    agent.next_step_prompt = None
+    agent.memory.add_message(Message.user_message("Cache opt-in check"))
+
+    await agent.think()
+    agent.memory.messages.pop()
+    await agent.think()
+    assert len(calls) == 2
+
+    agent.use_llm_cache = True
+    agent.memory.messages.pop()
+    await agent.think()
+    agent.memory.messages.pop()
+    await agent.think()
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bits", [1, 70])
+async def test_act_serializes_any_user_input_result(agent, bits):
+    """Test that non-str keys and wide integers still reach memory."""
+    agent.tool_calls = [make_call("call_0", "confirm", bits=bits)]
+
+    result = await agent.act()
+
+    assert result["requires_user_response"]
+    content = agent.messages[-1].content
+    assert "first" in content and str(2**bits) in content
+
+
+@pytest.mark.asyncio
+async def test_streamed_tool_calls_without_ids_run_once_each(agent):
+    """Test that streamed calls with empty or repeated ids keep their own results."""
+    async def ask_tool_stream(**kwargs):
+        yield make_call("", "sleep", text="A", delay=0)
+        yield make_call("", "sleep", text="B", delay=0)
+        yield make_call("dup", "sleep", text="C", delay=0)
+        yield make_call("dup", "sleep", text="D", delay=0)
+
+    agent.llm.ask_tool_stream = ask_tool_stream
+    agent.stream_tool_calls = True
+    agent.next_step_prompt = None
+
+    assert await agent.think()
+    await agent.act()
+
+    assert sorted(agent.available_tools.get_tool("sleep").calls) == [
+        "A",
+        "B",
+        "C",
+        "D",
+    ]
+    assert [msg.content.rsplit("\n", 1)[-1] for msg in agent.messages[1:]] == [
+        "A",
+        "B",
+        "C",
+        "D",
+    ]
+
+
+def test_special_tool_names_follow_changes(agent):
+    """Test that reassigning or mutating special_tool_names takes effect."""
+    assert agent._is_special_tool("Terminate")
+
+    agent.special_tool_names = ["ask_user"]
+    assert agent._is_special_tool("ask_user")
+    assert not agent._is_special_tool("terminate")
+
+    agent.special_tool_names.append("Sleep")
+    assert agent._is_special_tool("sleep")
+    assert not agent._is_parallel_safe(make_call("call_0", "sleep", text="x"))
+
+
+@pytest.mark.asyncio
+async def test_act_accepts_non_standard_json_arguments(agent):
+    """Test that arguments json.loads accepts still reach the tool."""
+    agent.tool_calls = [
+        ToolCall(
+            id="call_0",
+            function=Function(name="sleep", arguments='{"text": NaN, "delay": 0}'),
+        ),
+        ToolCall(id="call_1", function=Function(name="sleep", arguments="{oops")),
+    ]
+
+    result = await agent.act()
+
+    assert agent.messages[0].content.endswith("\nnan")
+    assert "Invalid JSON format" in agent.messages[1].content
+    assert "Error" in result